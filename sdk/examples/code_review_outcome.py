@@ -13,12 +13,22 @@ Inspired by tools like Greptile, this implementation:
 """
 
 import asyncio
+import hashlib
+import itertools
 import json
 import logging
-from dataclasses import dataclass, field
+import re
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field, replace
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional; falls back to the stdlib json module
+    orjson = None
 
 logger = logging.getLogger("code_review_outcome")
 
@@ -42,7 +52,99 @@ class IssueCategory(Enum):
     DOCUMENTATION = "documentation"
 
 
-@dataclass
+# Summary markers for each severity level
+SEVERITY_EMOJI = {
+    IssueSeverity.CRITICAL: "🔴",
+    IssueSeverity.HIGH: "🟠",
+    IssueSeverity.MEDIUM: "🟡",
+    IssueSeverity.LOW: "🔵",
+    IssueSeverity.INFO: "⚪",
+}
+
+# Prefixes for finding IDs, assigned once per-file results are merged
+FINDING_ID_PREFIXES = {
+    IssueCategory.BUG: "bug",
+    IssueCategory.SECURITY: "sec",
+    IssueCategory.PERFORMANCE: "perf",
+    IssueCategory.STYLE: "style",
+    IssueCategory.MAINTAINABILITY: "maint",
+    IssueCategory.DOCUMENTATION: "style",
+}
+
+# Literals the simulated review rules look for, keyed by signal name.
+# Signals in CASE_INSENSITIVE_SIGNALS match regardless of case.
+PATCH_SIGNALS = {
+    "jwt_sign": "jwt.sign",
+    "expires_in": "expiresIn",
+    "todo": "TODO",
+    "process_env": "process.env",
+    "secret": "secret",
+    "password": "password",
+    "find_user": "findUser",
+    "await_find_user": "await findUser",
+    "catch": "catch",
+    "async": "async",
+}
+CASE_INSENSITIVE_SIGNALS = {"secret", "password"}
+
+# All signals compiled into one pattern so a patch is scanned in a single
+# pass. The lookahead keeps matches zero-width, so overlapping literals
+# (e.g. "findUser" inside "await findUser") are all reported.
+_PATCH_SIGNAL_RE = re.compile("(?=" + "|".join(
+    f"(?P<{name}>(?i:{re.escape(literal)}))" if name in CASE_INSENSITIVE_SIGNALS
+    else f"(?P<{name}>{re.escape(literal)})"
+    for name, literal in PATCH_SIGNALS.items()
+) + ")")
+
+# Patches at least this long are scanned in a worker thread
+LARGE_PATCH_CHARS = 64 * 1024
+
+# Most recently used file analyses kept for re-reviews
+FINDING_CACHE_SIZE = 512
+
+# Path fragments that trigger escalation, matched against lowercased paths
+SENSITIVE_PATHS = ["security", "auth", "crypto", "payment"]
+CRITICAL_FILES = [".env", "config/production", "secrets"]
+_SENSITIVE_PATH_RE = re.compile("|".join(map(re.escape, SENSITIVE_PATHS)))
+_CRITICAL_PATH_RE = re.compile("|".join(map(re.escape, CRITICAL_FILES)))
+
+# Fetches PR metadata and commits in a single round-trip. The changed
+# files come from the REST diff (PR_DIFF_MEDIA_TYPE), fetched alongside:
+# it carries the patches GraphQL lacks and isn't capped at a page of files
+PR_BUNDLE_QUERY = """
+query($owner: String!, $repo: String!, $pr_number: Int!) {
+  repository(owner: $owner, name: $repo) {
+    pullRequest(number: $pr_number) {
+      title
+      body
+      author { login }
+      baseRefName
+      headRefName
+      changedFiles
+      additions
+      deletions
+      commits(first: 50) { nodes { commit { oid message } } }
+    }
+  }
+}
+"""
+
+# Accept header that makes GET /repos/{owner}/{repo}/pulls/{number}
+# return the PR's unified diff
+PR_DIFF_MEDIA_TYPE = "application/vnd.github.diff"
+
+_DIFF_FILE_HEADER_RE = re.compile(r"^diff --git a/\S+ b/(\S+)$", re.MULTILINE)
+
+# Extended diff header lines that mark a file's status; anything else
+# is a modification
+_DIFF_STATUS_LINES = (
+    ("new file mode", "added"),
+    ("deleted file mode", "deleted"),
+    ("rename from", "renamed"),
+)
+
+
+@dataclass(slots=True)
 class ReviewFinding:
     """A single finding from the code review."""
     id: str
@@ -52,13 +154,22 @@ class ReviewFinding:
     line_start: int
     line_end: int
     title: str
-    description: str
-    suggestion: Optional[str] = None
-    code_snippet: Optional[str] = None
+    # Long text fields are left out of repr to keep log lines short
+    description: str = field(repr=False)
+    suggestion: Optional[str] = field(default=None, repr=False)
+    code_snippet: Optional[str] = field(default=None, repr=False)
     confidence: float = 0.9
 
+    # Enum values cached at construction for serialization
+    severity_value: str = field(init=False, repr=False)
+    category_value: str = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.severity_value = self.severity.value
+        self.category_value = self.category.value
 
-@dataclass
+
+@dataclass(slots=True)
 class PRContext:
     """Context about the pull request being reviewed."""
     pr_number: int
@@ -73,7 +184,7 @@ class PRContext:
     commits: List[Dict[str, Any]] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class FileChange:
     """A changed file in the PR."""
     path: str
@@ -85,6 +196,36 @@ class FileChange:
     new_content: Optional[str] = None
 
 
+def _parse_diff(diff: str) -> List[FileChange]:
+    """Split a unified PR diff into one FileChange per file, in diff order."""
+    headers = list(_DIFF_FILE_HEADER_RE.finditer(diff))
+    file_changes = []
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(diff)
+        # Extended header lines (mode, index, ---/+++) precede the first hunk
+        extended, hunk_start, hunks = diff[header.end():end].partition("\n@@")
+        patch = hunk_start.lstrip("\n") + hunks
+        lines = patch.splitlines()
+        file_changes.append(FileChange(
+            path=header.group(1),
+            status=next(
+                (status for prefix, status in _DIFF_STATUS_LINES if f"\n{prefix}" in extended),
+                "modified",
+            ),
+            additions=sum(line.startswith("+") for line in lines),
+            deletions=sum(line.startswith("-") for line in lines),
+            patch=patch,
+        ))
+    return file_changes
+
+
+class ToolCall(NamedTuple):
+    """A tool call made during the review."""
+    tool: str
+    params: Dict[str, Any]
+    timestamp: float
+
+
 class CodeReviewOutcome:
     """
     Implements the code.review outcome type.
@@ -108,7 +249,15 @@ class CodeReviewOutcome:
 
         # Tracking
         self.findings: List[ReviewFinding] = []
-        self.tools_called = []
+        self.tools_called: List[ToolCall] = []
+        self._finding_ids = itertools.count()
+
+        # Limits how many files are analyzed at once
+        self._analyze_semaphore = asyncio.Semaphore(config.get('max_concurrent_files', 8))
+
+        # Findings per (file path, patch digest, review focus), so unchanged
+        # files are not re-analyzed when a PR is reviewed again
+        self._finding_cache: OrderedDict[Tuple[str, str, Tuple[str, ...]], List[ReviewFinding]] = OrderedDict()
 
     async def execute(
         self,
@@ -131,36 +280,52 @@ class CodeReviewOutcome:
         Returns:
             Dict containing review findings, decision, and metadata
         """
-        start_time = datetime.utcnow()
+        start_time = time.perf_counter()
         review_focus = review_focus or ["bugs", "security", "style", "maintainability"]
 
-        try:
-            # Step 1: Fetch PR context
-            pr_context = await self._get_pr_context(owner, repo, pr_number)
-
-            # Step 2: Fetch file changes
-            file_changes = await self._get_file_changes(owner, repo, pr_number)
+        # Tracking is per review; only the finding cache carries over
+        self.findings = []
+        self.tools_called = []
+        self._finding_ids = itertools.count()
 
-            # Step 3: Check for escalation triggers
-            escalation_trigger = self._check_escalation_triggers(pr_context, file_changes)
+        try:
+            # Step 1-2: Fetch PR context and file changes in one request
+            pr_context, file_changes = await self._get_pr_bundle(owner, repo, pr_number)
+
+            # Step 3: Check for escalation triggers, cheapest first
+            escalation_trigger = (
+                self._check_size_escalation(pr_context)
+                or self._check_path_escalation(file_changes)
+            )
             if escalation_trigger:
                 return await self._handle_escalation(
                     request_id, escalation_trigger, pr_context
                 )
 
-            # Step 4: Analyze each file
-            for file_change in file_changes:
-                await self._analyze_file(file_change, pr_context, review_focus)
+            # Step 4: Analyze all files concurrently; a single consumer
+            # collects their findings and assigns IDs in file order
+            findings_queue: asyncio.Queue = asyncio.Queue()
+            consumer = asyncio.create_task(self._drain_findings(findings_queue))
+            try:
+                await asyncio.gather(*[
+                    self._analyze_file(index, file_change, pr_context, review_focus, findings_queue)
+                    for index, file_change in enumerate(file_changes)
+                ])
+            finally:
+                await findings_queue.put(None)
+                await consumer
+
+            # Count once; the decision, summary and result all use it
+            by_severity = self._count_by_severity()
 
             # Step 5: Determine review decision
-            decision = self._determine_decision(pr_context)
+            decision = self._determine_decision(pr_context, by_severity)
 
             # Step 6: Generate review summary
-            summary = self._generate_summary()
+            summary = self._generate_summary(by_severity)
 
             # Calculate metrics
-            end_time = datetime.utcnow()
-            latency = (end_time - start_time).total_seconds()
+            latency = time.perf_counter() - start_time
 
             return {
                 "status": "completed",
@@ -168,7 +333,7 @@ class CodeReviewOutcome:
                     "decision": decision['action'],
                     "summary": summary,
                     "findings_count": len(self.findings),
-                    "findings_by_severity": self._count_by_severity(),
+                    "findings_by_severity": by_severity,
                 },
                 "artifacts": [
                     {
@@ -182,7 +347,7 @@ class CodeReviewOutcome:
                 ],
                 "findings": [self._finding_to_dict(f) for f in self.findings],
                 "decision": decision,
-                "tools_called": self.tools_called,
+                "tools_called": [self._tool_call_to_dict(t) for t in self.tools_called],
                 "metrics": {
                     "latency_seconds": latency,
                     "files_reviewed": len(file_changes),
@@ -197,16 +362,34 @@ class CodeReviewOutcome:
                 "error": str(e),
             }
 
-    async def _get_pr_context(self, owner: str, repo: str, pr_number: int) -> PRContext:
-        """Fetch PR metadata from GitHub."""
-        self._log_tool_call("github.get_pull_request", {
-            "owner": owner,
-            "repo": repo,
-            "pr_number": pr_number
-        })
+    async def _get_pr_bundle(
+        self,
+        owner: str,
+        repo: str,
+        pr_number: int
+    ) -> Tuple[PRContext, List[FileChange]]:
+        """
+        Fetch PR metadata and changed files from GitHub.
+
+        Metadata comes from one GraphQL query; the changed files and their
+        patches come from the REST diff, requested concurrently.
+        """
+        params = {"owner": owner, "repo": repo, "pr_number": pr_number}
+        self._log_tool_call("github.graphql", params)
+        self._log_tool_call("github.get_pr_diff", params)
+
+        # In production, both requests would be issued together:
+        # bundle, diff = await asyncio.gather(
+        #     self.github.graphql(PR_BUNDLE_QUERY, params),
+        #     self.github.get(
+        #         f"/repos/{owner}/{repo}/pulls/{pr_number}",
+        #         headers={"Accept": PR_DIFF_MEDIA_TYPE},
+        #     ),
+        # )
+        # and the simulated bundle below would be built from the response
 
         # Simulated response
-        return PRContext(
+        pr_context = PRContext(
             pr_number=pr_number,
             title="Add user authentication endpoint",
             description="Implements JWT-based authentication for the API",
@@ -222,27 +405,12 @@ class CodeReviewOutcome:
             ]
         )
 
-    async def _get_file_changes(
-        self,
-        owner: str,
-        repo: str,
-        pr_number: int
-    ) -> List[FileChange]:
-        """Fetch changed files from the PR."""
-        self._log_tool_call("github.get_diff", {
-            "owner": owner,
-            "repo": repo,
-            "pr_number": pr_number
-        })
-
-        # Simulated response
-        return [
-            FileChange(
-                path="src/auth/handler.ts",
-                status="added",
-                additions=120,
-                deletions=0,
-                patch="""
+        diff = """\
+diff --git a/src/auth/handler.ts b/src/auth/handler.ts
+new file mode 100644
+--- /dev/null
++++ b/src/auth/handler.ts
+@@ -0,0 +1,32 @@
 +import { Request, Response } from 'express';
 +import jwt from 'jsonwebtoken';
 +
@@ -275,14 +443,11 @@ class CodeReviewOutcome:
 +  const token = jwt.sign({ userId: user.id }, process.env.JWT_SECRET);
 +  return res.json({ token });
 +}
-""",
-            ),
-            FileChange(
-                path="src/auth/middleware.ts",
-                status="added",
-                additions=45,
-                deletions=0,
-                patch="""
+diff --git a/src/auth/middleware.ts b/src/auth/middleware.ts
+new file mode 100644
+--- /dev/null
++++ b/src/auth/middleware.ts
+@@ -0,0 +1,8 @@
 +import { Request, Response, NextFunction } from 'express';
 +
 +export function requireAuth(req: Request, res: Response, next: NextFunction) {
@@ -291,14 +456,9 @@ class CodeReviewOutcome:
 +  }
 +  next();
 +}
-""",
-            ),
-            FileChange(
-                path="src/routes/index.ts",
-                status="modified",
-                additions=10,
-                deletions=2,
-                patch="""
+diff --git a/src/routes/index.ts b/src/routes/index.ts
+--- a/src/routes/index.ts
++++ b/src/routes/index.ts
 @@ -5,6 +5,14 @@ import { Router } from 'express';
 +import { authenticate, login } from '../auth/handler';
 +import { requireAuth } from '../auth/middleware';
@@ -311,34 +471,29 @@ class CodeReviewOutcome:
 +
  // Protected routes
 +router.get('/profile', requireAuth, getProfile);
-""",
-            ),
-        ]
+"""
+        file_changes = _parse_diff(diff)
 
-    def _check_escalation_triggers(
-        self,
-        pr_context: PRContext,
-        file_changes: List[FileChange]
-    ) -> Optional[str]:
-        """Check if the PR should be escalated to human review."""
-        # Large PR
+        return pr_context, file_changes
+
+    def _check_size_escalation(self, pr_context: PRContext) -> Optional[str]:
+        """Check if the PR is too large for automated review."""
         if pr_context.additions + pr_context.deletions > 1000:
             return "large_pr"
+        return None
+
+    def _check_path_escalation(self, file_changes: List[FileChange]) -> Optional[str]:
+        """Check if the PR touches paths that require human review."""
+        paths = [file.path.lower() for file in file_changes]
 
         # Sensitive paths
-        sensitive_paths = ["security", "auth", "crypto", "payment"]
-        for file in file_changes:
-            for sensitive in sensitive_paths:
-                if sensitive in file.path.lower():
-                    if "changes_to_security_critical" in self.require_human_for:
-                        return "security_sensitive"
+        if "changes_to_security_critical" in self.require_human_for:
+            if any(_SENSITIVE_PATH_RE.search(path) for path in paths):
+                return "security_sensitive"
 
         # Changes to critical config
-        critical_files = [".env", "config/production", "secrets"]
-        for file in file_changes:
-            for critical in critical_files:
-                if critical in file.path.lower():
-                    return "critical_config"
+        if any(_CRITICAL_PATH_RE.search(path) for path in paths):
+            return "critical_config"
 
         return None
 
@@ -373,40 +528,111 @@ class CodeReviewOutcome:
 
     async def _analyze_file(
         self,
+        file_index: int,
         file_change: FileChange,
         pr_context: PRContext,
-        review_focus: List[str]
+        review_focus: List[str],
+        findings_queue: asyncio.Queue
     ):
-        """Analyze a single file for issues."""
-        self._log_tool_call("analyze_code", {"path": file_change.path})
-
-        # In production, this would use Claude to analyze the code
-        # Here we simulate finding some issues
-
-        # Security analysis
-        if "security" in review_focus:
-            await self._check_security_issues(file_change)
-
-        # Bug detection
-        if "bugs" in review_focus:
-            await self._check_bugs(file_change)
-
-        # Style issues
-        if "style" in review_focus:
-            await self._check_style(file_change)
-
-        # Maintainability
-        if "maintainability" in review_focus:
-            await self._check_maintainability(file_change)
+        """Analyze a single file and publish its findings to the queue."""
+        cache_key = (
+            file_change.path,
+            hashlib.blake2b(file_change.patch.encode(), digest_size=16).hexdigest(),
+            tuple(review_focus),
+        )
+        cached = self._finding_cache.get(cache_key)
+        if cached is not None:
+            self._finding_cache.move_to_end(cache_key)
+            # Hand out copies, since IDs are assigned on the recorded findings
+            await findings_queue.put((file_index, [replace(finding) for finding in cached]))
+            return
+
+        # Bound in-flight analyses so large PRs don't flood downstream APIs
+        async with self._analyze_semaphore:
+            self._log_tool_call("analyze_code", {"path": file_change.path})
+
+            # In production, this would use Claude to analyze the code
+            # Here we simulate finding some issues
+            if len(file_change.patch) >= LARGE_PATCH_CHARS:
+                # Keep the event loop responsive for other files' I/O
+                hits = await asyncio.to_thread(self._scan_patch, file_change.patch)
+            else:
+                hits = self._scan_patch(file_change.patch)
+            checks = []
+
+            # Security analysis
+            if "security" in review_focus:
+                checks.append(self._check_security_issues(file_change, hits))
+
+            # Bug detection
+            if "bugs" in review_focus:
+                checks.append(self._check_bugs(file_change, hits))
+
+            # Style issues
+            if "style" in review_focus:
+                checks.append(self._check_style(file_change, hits))
+
+            # Maintainability
+            if "maintainability" in review_focus:
+                checks.append(self._check_maintainability(file_change, hits))
+
+            # The checks are independent, so run them concurrently
+            results = await asyncio.gather(*checks, return_exceptions=True)
+
+            findings: List[ReviewFinding] = []
+            complete = True
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(f"Check failed for {file_change.path}: {result}")
+                    complete = False
+                    continue
+                findings.extend(result)
+
+        # Only cache full results so failed checks are retried next time
+        if complete:
+            self._finding_cache[cache_key] = [replace(finding) for finding in findings]
+            if len(self._finding_cache) > FINDING_CACHE_SIZE:
+                self._finding_cache.popitem(last=False)
+        await findings_queue.put((file_index, findings))
+
+    def _scan_patch(self, patch: str) -> Set[str]:
+        """Return the names of all PATCH_SIGNALS present in the patch."""
+        return {match.lastgroup for match in _PATCH_SIGNAL_RE.finditer(patch)}
+
+    async def _drain_findings(self, findings_queue: asyncio.Queue):
+        """
+        Record (file_index, findings) batches until a None sentinel arrives.
 
-    async def _check_security_issues(self, file_change: FileChange):
+        Files can finish in any order, so batches are held back until every
+        earlier file has been recorded; IDs then follow file order.
+        """
+        pending: Dict[int, List[ReviewFinding]] = {}
+        next_index = 0
+        while True:
+            item = await findings_queue.get()
+            if item is None:
+                return
+            file_index, findings = item
+            pending[file_index] = findings
+            while next_index in pending:
+                for finding in pending.pop(next_index):
+                    prefix = FINDING_ID_PREFIXES.get(finding.category, finding.category_value)
+                    finding.id = f"{prefix}_{next(self._finding_ids)}"
+                    self.findings.append(finding)
+                next_index += 1
+
+    async def _check_security_issues(
+        self,
+        file_change: FileChange,
+        hits: Set[str]
+    ) -> List[ReviewFinding]:
         """Check for security vulnerabilities."""
-        patch = file_change.patch
+        findings: List[ReviewFinding] = []
 
         # Check for hardcoded secrets
-        if "process.env" not in patch and ("secret" in patch.lower() or "password" in patch.lower()):
-            self.findings.append(ReviewFinding(
-                id=f"sec_{len(self.findings)}",
+        if "process_env" not in hits and ("secret" in hits or "password" in hits):
+            findings.append(ReviewFinding(
+                id="",
                 category=IssueCategory.SECURITY,
                 severity=IssueSeverity.CRITICAL,
                 file_path=file_change.path,
@@ -418,9 +644,9 @@ class CodeReviewOutcome:
             ))
 
         # Check for missing token expiration
-        if "jwt.sign" in patch and "expiresIn" not in patch:
-            self.findings.append(ReviewFinding(
-                id=f"sec_{len(self.findings)}",
+        if "jwt_sign" in hits and "expires_in" not in hits:
+            findings.append(ReviewFinding(
+                id="",
                 category=IssueCategory.SECURITY,
                 severity=IssueSeverity.HIGH,
                 file_path=file_change.path,
@@ -432,15 +658,21 @@ class CodeReviewOutcome:
                 confidence=0.95,
             ))
 
-    async def _check_bugs(self, file_change: FileChange):
+        return findings
+
+    async def _check_bugs(
+        self,
+        file_change: FileChange,
+        hits: Set[str]
+    ) -> List[ReviewFinding]:
         """Check for potential bugs."""
-        patch = file_change.patch
+        findings: List[ReviewFinding] = []
 
         # Check for missing await
-        if "async" in patch and "findUser" in patch:
-            if "await findUser" not in patch:
-                self.findings.append(ReviewFinding(
-                    id=f"bug_{len(self.findings)}",
+        if "async" in hits and "find_user" in hits:
+            if "await_find_user" not in hits:
+                findings.append(ReviewFinding(
+                    id="",
                     category=IssueCategory.BUG,
                     severity=IssueSeverity.HIGH,
                     file_path=file_change.path,
@@ -452,14 +684,20 @@ class CodeReviewOutcome:
                     confidence=0.85,
                 ))
 
-    async def _check_style(self, file_change: FileChange):
+        return findings
+
+    async def _check_style(
+        self,
+        file_change: FileChange,
+        hits: Set[str]
+    ) -> List[ReviewFinding]:
         """Check for style issues."""
-        patch = file_change.patch
+        findings: List[ReviewFinding] = []
 
         # Check for TODO comments
-        if "TODO" in patch:
-            self.findings.append(ReviewFinding(
-                id=f"style_{len(self.findings)}",
+        if "todo" in hits:
+            findings.append(ReviewFinding(
+                id="",
                 category=IssueCategory.DOCUMENTATION,
                 severity=IssueSeverity.LOW,
                 file_path=file_change.path,
@@ -471,12 +709,20 @@ class CodeReviewOutcome:
                 confidence=1.0,
             ))
 
-    async def _check_maintainability(self, file_change: FileChange):
+        return findings
+
+    async def _check_maintainability(
+        self,
+        file_change: FileChange,
+        hits: Set[str]
+    ) -> List[ReviewFinding]:
         """Check for maintainability issues."""
+        findings: List[ReviewFinding] = []
+
         # Check for missing error handling
-        if "catch" in file_change.patch:
-            self.findings.append(ReviewFinding(
-                id=f"maint_{len(self.findings)}",
+        if "catch" in hits:
+            findings.append(ReviewFinding(
+                id="",
                 category=IssueCategory.MAINTAINABILITY,
                 severity=IssueSeverity.MEDIUM,
                 file_path=file_change.path,
@@ -488,10 +734,16 @@ class CodeReviewOutcome:
                 confidence=0.75,
             ))
 
-    def _determine_decision(self, pr_context: PRContext) -> Dict[str, Any]:
+        return findings
+
+    def _determine_decision(
+        self,
+        pr_context: PRContext,
+        by_severity: Dict[str, int]
+    ) -> Dict[str, Any]:
         """Determine the review decision based on findings."""
-        critical_count = len([f for f in self.findings if f.severity == IssueSeverity.CRITICAL])
-        high_count = len([f for f in self.findings if f.severity == IssueSeverity.HIGH])
+        critical_count = by_severity[IssueSeverity.CRITICAL.value]
+        high_count = by_severity[IssueSeverity.HIGH.value]
 
         # Check auto-approve conditions
         if self.auto_approve_enabled:
@@ -542,20 +794,21 @@ class CodeReviewOutcome:
                 pass
         return True
 
-    def _generate_summary(self) -> str:
+    def _generate_summary(self, by_severity: Dict[str, int]) -> str:
         """Generate a human-readable review summary."""
-        by_severity = self._count_by_severity()
-
         summary_parts = ["## Code Review Summary\n"]
 
         if not self.findings:
             summary_parts.append("No issues found. Code looks good!\n")
         else:
             summary_parts.append(f"Found **{len(self.findings)}** issue(s):\n")
-            for severity, count in by_severity.items():
+            # Iterate in enum order so the summary text is stable
+            for severity in IssueSeverity:
+                count = by_severity[severity.value]
                 if count > 0:
-                    emoji = {"critical": "🔴", "high": "🟠", "medium": "🟡", "low": "🔵", "info": "⚪"}.get(severity, "")
-                    summary_parts.append(f"- {emoji} {severity.title()}: {count}\n")
+                    summary_parts.append(
+                        f"- {SEVERITY_EMOJI[severity]} {severity.value.title()}: {count}\n"
+                    )
 
             summary_parts.append("\n### Key Findings\n")
             for finding in self.findings[:5]:  # Top 5 findings
@@ -566,30 +819,31 @@ class CodeReviewOutcome:
     def _count_by_severity(self) -> Dict[str, int]:
         """Count findings by severity."""
         counts = {s.value: 0 for s in IssueSeverity}
-        for finding in self.findings:
-            counts[finding.severity.value] += 1
+        counts.update(Counter(f.severity_value for f in self.findings))
         return counts
 
     def _format_findings_as_comments(self) -> List[Dict[str, Any]]:
         """Format findings as GitHub review comments."""
         comments = []
         for finding in self.findings:
-            comment = {
+            # Build the body in one f-string rather than appending to it
+            suggestion = f"\n\n**Suggestion**: {finding.suggestion}" if finding.suggestion else ""
+            comments.append({
                 "path": finding.file_path,
                 "line": finding.line_start,
-                "body": f"**{finding.severity.value.upper()}**: {finding.title}\n\n{finding.description}",
-            }
-            if finding.suggestion:
-                comment["body"] += f"\n\n**Suggestion**: {finding.suggestion}"
-            comments.append(comment)
+                "body": (
+                    f"**{finding.severity_value.upper()}**: {finding.title}"
+                    f"\n\n{finding.description}{suggestion}"
+                ),
+            })
         return comments
 
     def _finding_to_dict(self, finding: ReviewFinding) -> Dict[str, Any]:
         """Convert finding to dictionary."""
         return {
             "id": finding.id,
-            "category": finding.category.value,
-            "severity": finding.severity.value,
+            "category": finding.category_value,
+            "severity": finding.severity_value,
             "file_path": finding.file_path,
             "line_start": finding.line_start,
             "line_end": finding.line_end,
@@ -601,11 +855,16 @@ class CodeReviewOutcome:
 
     def _log_tool_call(self, tool: str, params: Dict[str, Any]):
         """Log a tool call."""
-        self.tools_called.append({
-            "tool": tool,
-            "params": params,
-            "timestamp": datetime.utcnow().isoformat() + "Z",
-        })
+        # Store the raw epoch time; it is only formatted when serialized
+        self.tools_called.append(ToolCall(tool, params, time.time()))
+
+    def _tool_call_to_dict(self, tool_call: ToolCall) -> Dict[str, Any]:
+        """Convert a logged tool call to a dictionary."""
+        return {
+            "tool": tool_call.tool,
+            "params": tool_call.params,
+            "timestamp": datetime.utcfromtimestamp(tool_call.timestamp).isoformat() + "Z",
+        }
 
 
 # Example usage
@@ -637,7 +896,10 @@ async def main():
         review_focus=["security", "bugs", "style", "maintainability"]
     )
 
-    print(json.dumps(result, indent=2, default=str))
+    if orjson is not None:
+        print(orjson.dumps(result, default=str, option=orjson.OPT_INDENT_2).decode())
+    else:
+        print(json.dumps(result, indent=2, default=str))
 
 
 if __name__ == "__main__":
@@ -7,11 +7,22 @@ Outcomes Protocol and Claude Agent SDK.
 """
 
 import asyncio
+import functools
 import json
 import logging
-from dataclasses import dataclass
+import re
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional; falls back to the stdlib json module
+    orjson = None
 
 # In production, these would be actual SDK imports
 # from anthropic import Anthropic
@@ -19,8 +30,170 @@ from typing import Any, Dict, List, Optional
 
 logger = logging.getLogger("cs_outcome")
 
+# Keywords used by the simulated inquiry analysis, matched in one pass.
+# The lookahead keeps matches zero-width so overlapping keywords are all found.
+_INQUIRY_KEYWORD_RE = re.compile(r"(?=(where|order|refund|speak to|human))", re.IGNORECASE)
+
+# Number of recent conversation turns passed to inquiry analysis
+HISTORY_SUMMARY_TURNS = 6
+
+# Most recently used context lookups kept per outcome instance
+CONTEXT_CACHE_SIZE = 1024
+
+VIP_TIERS = frozenset({"gold", "platinum"})
+
+# Escalation rules as (predicate(analysis, customer), trigger), checked in order
+ESCALATION_RULES = [
+    # Explicit request
+    (lambda analysis, customer: analysis['issue_type'] == 'escalation_request', "explicit_request"),
+    # Low confidence
+    (lambda analysis, customer: analysis['confidence'] < 0.7, "confidence_threshold"),
+    # Frustrated sentiment + high-value customer
+    (
+        lambda analysis, customer: analysis['sentiment'] == 'frustrated' and customer.tier in VIP_TIERS,
+        "vip_frustrated",
+    ),
+]
+
+# Recommended next step for the human agent, by escalation trigger
+ESCALATION_RECOMMENDATIONS = MappingProxyType({
+    "explicit_request": "Customer explicitly requested human assistance. Acknowledge and assist.",
+    "confidence_threshold": "AI was uncertain about resolution. Review context and resolve.",
+    "vip_frustrated": "High-value customer is frustrated. Consider goodwill gesture.",
+})
+DEFAULT_ESCALATION_RECOMMENDATION = "Review and resolve customer issue."
+
+# Unambiguous requests for a human, handled before any inquiry analysis
+_ESCALATION_RE = re.compile(
+    r"\b(speak to (a |the )?(human|agent|person|someone)|talk to (a |the )?human|real person)\b",
+    re.IGNORECASE,
+)
+
+# Response templates keyed by resolution action, filled from the
+# customer's name and the resolution data
+RESPONSE_TEMPLATES = {
+    "provided_tracking": (
+        "Hi {name}! Great news - your order {order_id} is on its way! "
+        "It's currently {status} and should arrive by {delivery_estimate}. "
+        "You can track it with tracking number: {tracking_number}. "
+        "Is there anything else I can help you with?"
+    ),
+    "refund_processed": (
+        "I've processed a refund of ${refund_amount:.2f} for order {order_id}. "
+        "You should see this back on your original payment method within 5-7 business days. "
+        "Is there anything else I can help you with today?"
+    ),
+    "partial_refund_offered": (
+        "I can immediately process a ${offered_amount:.2f} refund for you. "
+        "For the remaining amount, I'll connect you with a specialist who can help further. "
+        "Would you like me to proceed with the partial refund now?"
+    ),
+}
+DEFAULT_RESPONSE_TEMPLATE = (
+    "Thank you for reaching out, {name}! "
+    "I've found some helpful information for you. "
+    "Is there anything specific you'd like to know more about?"
+)
+
+
+# Simulated MCP payloads are built once and shared read-only, so load
+# tests against the mocks don't measure allocator churn
+_SIMULATED_ORDER_HISTORY = (
+    MappingProxyType({
+        "order_id": "ORD-12345",
+        "status": "shipped",
+        "items": (MappingProxyType({"name": "Widget Pro", "quantity": 2, "price": 49.99}),),
+        "total": 99.98,
+        "created_at": "2025-01-10T10:00:00Z",
+        "shipped_at": "2025-01-12T14:00:00Z",
+        "tracking_number": "TRK123456789",
+        "delivery_estimate": "2025-01-18",
+    }),
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def _simulated_customer(customer_id: str) -> MappingProxyType:
+    """Simulated CRM record for a customer."""
+    return MappingProxyType({
+        "customer_id": customer_id,
+        "name": "Jane Smith",
+        "email": "jane.smith@example.com",
+        "tier": "gold",
+        "lifetime_value": 2500.00,
+        "previous_interactions": 12,
+        "sentiment_history": ("positive", "neutral", "positive"),
+    })
+
+
+@functools.lru_cache(maxsize=1024)
+def _simulated_shipment_status(order_id: str) -> MappingProxyType:
+    """Simulated shipment status for an order."""
+    return MappingProxyType({
+        "order_id": order_id,
+        "status": "shipped",
+        "tracking_number": "TRK123456789",
+        "delivery_estimate": "2025-01-18",
+    })
+
+
+class StalledResolution(Exception):
+    """Raised when a resolution repeats actions or exceeds its action budget."""
+
+
+class MCPHost:
+    """
+    Process-wide MCP sessions shared by all outcome instances.
+
+    Connecting once per process amortizes server startup and connection
+    setup across requests instead of paying it per outcome instance.
+    """
+
+    def __init__(self):
+        self.sessions: Dict[str, Any] = {}
+        # One lock per server; calls to different servers don't contend.
+        # asyncio locks belong to one event loop, so they are recreated
+        # when a different loop uses the host
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._locks_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._exit_stack = AsyncExitStack()
+
+    def lock(self, server: str) -> asyncio.Lock:
+        """Return the session lock for a server on the running event loop."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._locks_loop:
+            self._locks.clear()
+            self._locks_loop = loop
+        return self._locks[server]
+
+    async def connect(self, name: str, server_params: Dict[str, Any]):
+        """Open a session to an MCP server and register it under name."""
+        logger.info(f"Connecting to MCP server {name}")
+
+        # In production, this would start the server and open a session
+        # read, write = await self._exit_stack.enter_async_context(stdio_client(server_params))
+        # session = await self._exit_stack.enter_async_context(ClientSession(read, write))
+        # await session.initialize()
+        # self.sessions[name] = session
+
+    async def connect_all(self, servers: Dict[str, Dict[str, Any]]):
+        """Connect to all servers concurrently."""
+        await asyncio.gather(*[
+            self.connect(name, server_params)
+            for name, server_params in servers.items()
+        ])
+
+    async def close(self):
+        """Close all sessions."""
+        await self._exit_stack.aclose()
+        self.sessions.clear()
 
-@dataclass
+
+# Shared by every CustomerServiceOutcome in the process
+_MCP_HOST = MCPHost()
+
+
+@dataclass(slots=True, frozen=True)
 class CustomerContext:
     """Customer information retrieved from CRM."""
     customer_id: str
@@ -29,15 +202,15 @@ class CustomerContext:
     tier: str  # bronze, silver, gold, platinum
     lifetime_value: float
     previous_interactions: int
-    sentiment_history: List[str]
+    sentiment_history: Tuple[str, ...]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class OrderContext:
     """Order information retrieved from order system."""
     order_id: str
     status: str
-    items: List[Dict[str, Any]]
+    items: Sequence[Mapping[str, Any]]
     total: float
     created_at: str
     shipped_at: Optional[str]
@@ -45,6 +218,15 @@ class OrderContext:
     delivery_estimate: Optional[str]
 
 
+@dataclass(slots=True)
+class RequestState:
+    """Action and tool logs plus stall-detection state for one resolution."""
+    actions_taken: List[Dict[str, Any]] = field(default_factory=list)
+    tools_called: List[Dict[str, Any]] = field(default_factory=list)
+    action_count: int = 0
+    action_signatures: Set[int] = field(default_factory=set)
+
+
 class CustomerServiceOutcome:
     """
     Implements the cs.resolve outcome type.
@@ -57,7 +239,7 @@ class CustomerServiceOutcome:
     5. Handling escalation when needed
     """
 
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], log_sink: Any = None):
         self.config = config
         self.max_latency = config.get('max_latency_seconds', 300)
         self.max_refund = config.get('tools', {}).get('limits', {}).get(
@@ -67,15 +249,45 @@ class CustomerServiceOutcome:
             'orders.apply_discount', {}
         ).get('allowed_codes', [])
 
-        # MCP clients would be initialized here
-        self.crm_client = None
-        self.orders_client = None
-        self.knowledge_client = None
-
-        # Tracking
+        # Tracking, across every request handled by this instance
         self.actions_taken = []
         self.tools_called = []
 
+        # Optional sink with an async write_batch(entries) method; logs are
+        # written to it once per request rather than per entry
+        self.log_sink = log_sink
+        self._flush_tasks: Set[asyncio.Task] = set()
+
+        # Guards against runaway resolutions: a cap on actions per request;
+        # repeated identical actions are tracked in each RequestState
+        self._action_budget = config.get('max_actions', 10)
+
+        # Context lookups cached per (server.method, customer_id) as
+        # (fetched_at, result), so repeat turns skip the MCP round-trip
+        self._context_cache: OrderedDict[Tuple[str, str], Tuple[float, Any]] = OrderedDict()
+        self._context_cache_ttls = {
+            "crm.get_customer": config.get('customer_cache_ttl', 60),
+            "orders.get_order_history": config.get('orders_cache_ttl', 10),
+        }
+        # customer_id -> [lock, turns holding or waiting on it]; entries
+        # are dropped once no turn needs them
+        self._context_locks: Dict[str, List[Any]] = {}
+
+    @property
+    def crm_client(self) -> Any:
+        """Shared CRM MCP session."""
+        return _MCP_HOST.sessions.get("crm")
+
+    @property
+    def orders_client(self) -> Any:
+        """Shared orders MCP session."""
+        return _MCP_HOST.sessions.get("orders")
+
+    @property
+    def knowledge_client(self) -> Any:
+        """Shared knowledge base MCP session."""
+        return _MCP_HOST.sessions.get("knowledge")
+
     async def execute(
         self,
         request_id: str,
@@ -97,34 +309,120 @@ class CustomerServiceOutcome:
         Returns:
             Dict containing resolution result, actions taken, and metadata
         """
-        start_time = datetime.utcnow()
+        start_time = time.perf_counter()
+        state = RequestState()
 
+        # Step 1: Gather context in a single MCP round-trip
         try:
-            # Step 1: Gather context
-            customer = await self._get_customer_context(customer_id)
-            orders = await self._get_recent_orders(customer_id)
+            prefetched = await self._prefetch_context(customer_id, state)
+        except Exception as e:
+            logger.error(f"Error in customer service outcome: {e}")
+            return self._error_result(state, "failed", e)
+
+        return await self._execute_with_prefetched(
+            state, request_id, initial_message, conversation_history, prefetched, start_time
+        )
+
+    async def execute_batch(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Execute several resolutions, sharing one context fetch.
+
+        Customer and order context for every request is fetched in a single
+        batched MCP round-trip; the resolutions then run concurrently.
+
+        Args:
+            requests: Dicts of keyword arguments accepted by execute()
+
+        Returns:
+            Results in the same order as requests
+        """
+        start_time = time.perf_counter()
+        # The shared fetch is logged and flushed once, then listed in the
+        # tools_called of every result it served
+        batch_state = RequestState()
+        try:
+            prefetched = await self._prefetch_many([r['customer_id'] for r in requests], batch_state)
+        except Exception as e:
+            logger.error(f"Error in customer service outcome batch: {e}")
+            results = [self._error_result(RequestState(), "failed", e) for _ in requests]
+        else:
+            results = await asyncio.gather(*[
+                self._execute_with_prefetched(
+                    RequestState(),
+                    r['request_id'],
+                    r['initial_message'],
+                    r.get('conversation_history'),
+                    prefetched[r['customer_id']],
+                    start_time
+                )
+                for r in requests
+            ])
+        finally:
+            _, batch_tools = self._record(batch_state)
+
+        for result in results:
+            result["tools_called"] = batch_tools + result.get("tools_called", [])
+        return results
+
+    async def _execute_with_prefetched(
+        self,
+        state: RequestState,
+        request_id: str,
+        initial_message: str,
+        conversation_history: Optional[List[Dict[str, Any]]],
+        prefetched: Dict[str, Any],
+        start_time: float
+    ) -> Dict[str, Any]:
+        """Run a resolution against already-fetched customer and order context."""
+        shipment_task = None
+
+        try:
+            customer = self._get_customer_context(prefetched)
+            orders = self._get_recent_orders(prefetched)
+
+            # Explicit requests for a human skip analysis entirely
+            if _ESCALATION_RE.search(initial_message):
+                return await self._handle_escalation(
+                    state, request_id, "explicit_request", customer, {
+                        "issue_type": "escalation_request",
+                        "details": {},
+                        "sentiment": "frustrated",
+                        "urgency": "high",
+                        "confidence": 1.0,
+                    }
+                )
+
+            # Speculatively fetch shipment status while the inquiry is
+            # analyzed; only order tracking uses it
+            if orders:
+                shipment_task = asyncio.create_task(
+                    self._prefetch_shipment(orders[0].order_id)
+                )
 
             # Step 2: Analyze the inquiry
+            history_features = self._summarize_history(conversation_history or [])
             analysis = await self._analyze_inquiry(
                 initial_message,
                 customer,
                 orders,
-                conversation_history or []
+                history_features
             )
 
             # Step 3: Check for escalation triggers
             escalation_trigger = self._check_escalation_triggers(analysis, customer)
             if escalation_trigger:
                 return await self._handle_escalation(
-                    request_id, escalation_trigger, customer, analysis
+                    state, request_id, escalation_trigger, customer, analysis
                 )
 
             # Step 4: Resolve the issue
             resolution = await self._resolve_issue(
+                state,
                 analysis['issue_type'],
                 analysis['details'],
                 customer,
-                orders
+                orders,
+                shipment_task
             )
 
             # Step 5: Generate response and confirm resolution
@@ -135,8 +433,9 @@ class CustomerServiceOutcome:
             )
 
             # Calculate metrics
-            end_time = datetime.utcnow()
-            latency = (end_time - start_time).total_seconds()
+            latency = time.perf_counter() - start_time
+
+            actions_taken, tools_called = self._record(state)
 
             return {
                 "status": "completed",
@@ -151,8 +450,8 @@ class CustomerServiceOutcome:
                         "content": response_message,
                     }
                 ],
-                "actions_taken": self.actions_taken,
-                "tools_called": self.tools_called,
+                "actions_taken": actions_taken,
+                "tools_called": tools_called,
                 "metrics": {
                     "latency_seconds": latency,
                     "tokens_used": resolution.get('tokens_used', 0),
@@ -160,64 +459,238 @@ class CustomerServiceOutcome:
                 },
             }
 
+        except StalledResolution as e:
+            logger.warning(f"Aborting stalled customer service resolution: {e}")
+            return self._error_result(state, "aborted", e)
+
         except Exception as e:
             logger.error(f"Error in customer service outcome: {e}")
+            return self._error_result(state, "failed", e)
+
+        finally:
+            # No-op if the tracking branch already consumed the result
+            if shipment_task is not None:
+                shipment_task.cancel()
+
+    def _error_result(self, state: RequestState, status: str, error: Exception) -> Dict[str, Any]:
+        """Record logs and build the result for an aborted or failed resolution."""
+        actions_taken, _ = self._record(state)
+        return {
+            "status": status,
+            "error": str(error),
+            "actions_taken": actions_taken,
+        }
+
+    async def _prefetch_context(self, customer_id: str, state: RequestState) -> Dict[str, Any]:
+        """Fetch customer and order context, batching only cache misses."""
+        calls = [
+            ("crm", "get_customer", {"customer_id": customer_id}),
+            ("orders", "get_order_history", {"customer_id": customer_id}),
+        ]
+
+        # One lock per customer so concurrent turns share a cold-cache fetch
+        async with self._customer_lock(customer_id):
+            now = time.monotonic()
+            prefetched = {}
+            misses = []
+            for server, method, params in calls:
+                key = f"{server}.{method}"
+                cached = self._context_cache.get((key, customer_id))
+                if cached and now - cached[0] < self._context_cache_ttls[key]:
+                    self._context_cache.move_to_end((key, customer_id))
+                    prefetched[key] = cached[1]
+                else:
+                    misses.append((server, method, params))
+
+            if misses:
+                results = await self._mcp_batch(misses, state)
+                for key, result in results.items():
+                    self._cache_context(key, customer_id, now, result)
+                prefetched.update(results)
+
+        return prefetched
+
+    @asynccontextmanager
+    async def _customer_lock(self, customer_id: str):
+        """Hold a customer's context lock, discarding it once it is idle."""
+        entry = self._context_locks.get(customer_id)
+        if entry is None:
+            entry = self._context_locks[customer_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._context_locks[customer_id]
+
+    def _cache_context(self, key: str, customer_id: str, fetched_at: float, result: Any):
+        """Cache a context lookup, evicting expired and least recently used entries."""
+        cache = self._context_cache
+        cache[(key, customer_id)] = (fetched_at, result)
+        cache.move_to_end((key, customer_id))
+        # Least recently used entries sit at the front; drop any that expired
+        while cache:
+            (oldest_key, _), (oldest_at, _) = next(iter(cache.items()))
+            if fetched_at - oldest_at < self._context_cache_ttls[oldest_key]:
+                break
+            cache.popitem(last=False)
+        if len(cache) > CONTEXT_CACHE_SIZE:
+            cache.popitem(last=False)
+
+    async def _prefetch_many(
+        self,
+        customer_ids: List[str],
+        state: RequestState
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch customer and order context for many customers at once.
+
+        Uses the servers' multi-customer methods so the whole batch costs one
+        round-trip per server. Results also warm the context cache.
+
+        Returns:
+            Dict mapping customer_id to the same shape _prefetch_context returns
+        """
+        unique_ids = list(dict.fromkeys(customer_ids))
+        results = await self._mcp_batch([
+            ("crm", "get_many", {"customer_ids": unique_ids}),
+            ("orders", "get_many_histories", {"customer_ids": unique_ids}),
+        ], state)
+
+        now = time.monotonic()
+        prefetched = {}
+        for customer_id in unique_ids:
+            context = {
+                "crm.get_customer": results["crm.get_many"][customer_id],
+                "orders.get_order_history": results["orders.get_many_histories"][customer_id],
+            }
+            for key, result in context.items():
+                self._cache_context(key, customer_id, now, result)
+            prefetched[customer_id] = context
+        return prefetched
+
+    async def _prefetch_shipment(
+        self,
+        order_id: str,
+        state: Optional[RequestState] = None
+    ) -> Dict[str, Any]:
+        """Fetch shipment status for an order, logging the call to state if given."""
+        results = await self._mcp_batch([
+            ("orders", "get_shipment_status", {"order_id": order_id}),
+        ], state)
+        return results["orders.get_shipment_status"]
+
+    async def _mcp_batch(
+        self,
+        calls: List[Tuple[str, str, Dict[str, Any]]],
+        state: Optional[RequestState]
+    ) -> Dict[str, Any]:
+        """
+        Issue several MCP calls in one round-trip.
+
+        Calls are grouped by server and each group is sent as one batch;
+        groups for different servers are sent concurrently.
+
+        Args:
+            calls: (server, method, params) tuples
+            state: Request to record the calls against; None for speculative
+                calls, which are logged by whoever uses their result
+
+        Returns:
+            Dict mapping "server.method" to each call's result
+        """
+        by_server: Dict[str, List[Tuple[str, Dict[str, Any]]]] = defaultdict(list)
+        for server, method, params in calls:
+            if state is not None:
+                self._log_tool_call(state, f"{server}.{method}", params)
+            by_server[server].append((method, params))
+
+        results = await asyncio.gather(*[
+            self._safe_call(server, server_calls)
+            for server, server_calls in by_server.items()
+        ])
+
+        merged: Dict[str, Any] = {}
+        for server_results in results:
+            merged.update(server_results)
+        return merged
+
+    async def _safe_call(
+        self,
+        server: str,
+        calls: List[Tuple[str, Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """Send calls to one server while holding that server's session lock."""
+        # Sessions are shared, so interleaved requests could corrupt them
+        async with _MCP_HOST.lock(server):
+            # In production, this would send a single JSON-RPC batch (array) frame
+            # results = await getattr(self, f"{server}_client").send_batch([
+            #     {"method": method, "params": params} for method, params in calls
+            # ])
+
             return {
-                "status": "failed",
-                "error": str(e),
-                "actions_taken": self.actions_taken,
+                f"{server}.{method}": self._simulate_mcp_call(server, method, params)
+                for method, params in calls
             }
 
-    async def _get_customer_context(self, customer_id: str) -> CustomerContext:
-        """Retrieve customer information from CRM."""
-        self._log_tool_call("crm.get_customer", {"customer_id": customer_id})
-
-        # In production, this would call the CRM MCP server
-        # customer_data = await self.crm_client.call("get_customer", customer_id=customer_id)
-
-        # Simulated response
-        return CustomerContext(
-            customer_id=customer_id,
-            name="Jane Smith",
-            email="jane.smith@example.com",
-            tier="gold",
-            lifetime_value=2500.00,
-            previous_interactions=12,
-            sentiment_history=["positive", "neutral", "positive"]
-        )
+    def _simulate_mcp_call(self, server: str, method: str, params: Dict[str, Any]) -> Any:
+        """Return a simulated MCP result."""
+        if (server, method) == ("crm", "get_customer"):
+            return _simulated_customer(params["customer_id"])
+        if (server, method) == ("orders", "get_order_history"):
+            return _SIMULATED_ORDER_HISTORY
+        if (server, method) == ("crm", "get_many"):
+            return {cid: _simulated_customer(cid) for cid in params["customer_ids"]}
+        if (server, method) == ("orders", "get_many_histories"):
+            return {cid: _SIMULATED_ORDER_HISTORY for cid in params["customer_ids"]}
+        if (server, method) == ("orders", "get_shipment_status"):
+            return _simulated_shipment_status(params["order_id"])
+        return None
 
-    async def _get_recent_orders(self, customer_id: str) -> List[OrderContext]:
-        """Retrieve recent orders for customer."""
-        self._log_tool_call("orders.get_order_history", {"customer_id": customer_id})
-
-        # Simulated response
-        return [
-            OrderContext(
-                order_id="ORD-12345",
-                status="shipped",
-                items=[{"name": "Widget Pro", "quantity": 2, "price": 49.99}],
-                total=99.98,
-                created_at="2025-01-10T10:00:00Z",
-                shipped_at="2025-01-12T14:00:00Z",
-                tracking_number="TRK123456789",
-                delivery_estimate="2025-01-18"
-            )
-        ]
+    def _get_customer_context(self, prefetched: Dict[str, Any]) -> CustomerContext:
+        """Build customer information from the prefetched CRM result."""
+        return CustomerContext(**prefetched["crm.get_customer"])
+
+    def _get_recent_orders(self, prefetched: Dict[str, Any]) -> List[OrderContext]:
+        """Build recent orders from the prefetched order history."""
+        return [OrderContext(**order) for order in prefetched["orders.get_order_history"]]
+
+    def _summarize_history(self, history: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Reduce the conversation history to the features analysis needs.
+
+        Only the most recent turns are kept verbatim, so prompt size stays
+        bounded as the conversation grows.
+        """
+        last_user = next(
+            (turn.get('content', '') for turn in reversed(history) if turn.get('role') == 'user'),
+            "",
+        )
+        recent = history[-HISTORY_SUMMARY_TURNS:]
+        return {
+            "last_user": last_user,
+            "turn_count": len(history),
+            "summary": "\n".join(
+                f"{turn.get('role', 'user')}: {turn.get('content', '')}" for turn in recent
+            ),
+        }
 
     async def _analyze_inquiry(
         self,
         message: str,
         customer: CustomerContext,
         orders: List[OrderContext],
-        history: List[Dict[str, Any]]
+        history_features: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Analyze the customer's inquiry to understand intent."""
         # In production, this would use Claude to analyze the message
 
         # Simulated analysis
-        message_lower = message.lower()
+        hits = {keyword.lower() for keyword in _INQUIRY_KEYWORD_RE.findall(message)}
 
-        if "where" in message_lower and "order" in message_lower:
+        if "where" in hits and "order" in hits:
             return {
                 "issue_type": "order_tracking",
                 "details": {
@@ -227,7 +700,7 @@ class CustomerServiceOutcome:
                 "urgency": "normal",
                 "confidence": 0.95,
             }
-        elif "refund" in message_lower:
+        elif "refund" in hits:
             return {
                 "issue_type": "refund_request",
                 "details": {
@@ -237,7 +710,7 @@ class CustomerServiceOutcome:
                 "urgency": "normal",
                 "confidence": 0.88,
             }
-        elif "speak to" in message_lower or "human" in message_lower:
+        elif "speak to" in hits or "human" in hits:
             return {
                 "issue_type": "escalation_request",
                 "details": {},
@@ -260,29 +733,21 @@ class CustomerServiceOutcome:
         customer: CustomerContext
     ) -> Optional[str]:
         """Check if any escalation triggers are met."""
-        # Explicit request
-        if analysis['issue_type'] == 'escalation_request':
-            return "explicit_request"
-
-        # Low confidence
-        if analysis['confidence'] < 0.7:
-            return "confidence_threshold"
-
-        # Frustrated sentiment + high-value customer
-        if analysis['sentiment'] == 'frustrated' and customer.tier in ['gold', 'platinum']:
-            return "vip_frustrated"
-
-        return None
+        return next(
+            (trigger for predicate, trigger in ESCALATION_RULES if predicate(analysis, customer)),
+            None,
+        )
 
     async def _handle_escalation(
         self,
+        state: RequestState,
         request_id: str,
         trigger: str,
         customer: CustomerContext,
         analysis: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Handle escalation to human agent."""
-        self._log_action("escalate_to_human", {"trigger": trigger})
+        self._log_action(state, "escalate_to_human", {"trigger": trigger})
 
         # Generate handoff summary
         summary = {
@@ -297,13 +762,15 @@ class CustomerServiceOutcome:
             "recommended_action": self._get_escalation_recommendation(trigger, analysis),
         }
 
+        actions_taken, _ = self._record(state)
+
         return {
             "status": "escalated",
             "escalation": {
                 "trigger": trigger,
                 "summary": summary,
             },
-            "actions_taken": self.actions_taken,
+            "actions_taken": actions_taken,
         }
 
     def _get_escalation_recommendation(
@@ -312,32 +779,31 @@ class CustomerServiceOutcome:
         analysis: Dict[str, Any]
     ) -> str:
         """Get recommended action for human agent."""
-        recommendations = {
-            "explicit_request": "Customer explicitly requested human assistance. Acknowledge and assist.",
-            "confidence_threshold": "AI was uncertain about resolution. Review context and resolve.",
-            "vip_frustrated": "High-value customer is frustrated. Consider goodwill gesture.",
-        }
-        return recommendations.get(trigger, "Review and resolve customer issue.")
+        return ESCALATION_RECOMMENDATIONS.get(trigger, DEFAULT_ESCALATION_RECOMMENDATION)
 
     async def _resolve_issue(
         self,
+        state: RequestState,
         issue_type: str,
         details: Dict[str, Any],
         customer: CustomerContext,
-        orders: List[OrderContext]
+        orders: List[OrderContext],
+        shipment_task: Optional["asyncio.Task[Dict[str, Any]]"] = None
     ) -> Dict[str, Any]:
         """Resolve the customer's issue based on type."""
         if issue_type == "order_tracking":
-            return await self._resolve_order_tracking(details, orders)
+            return await self._resolve_order_tracking(state, details, orders, shipment_task)
         elif issue_type == "refund_request":
-            return await self._resolve_refund_request(details, orders, customer)
+            return await self._resolve_refund_request(state, details, orders, customer)
         else:
-            return await self._resolve_general_inquiry(details, customer)
+            return await self._resolve_general_inquiry(state, details, customer)
 
     async def _resolve_order_tracking(
         self,
+        state: RequestState,
         details: Dict[str, Any],
-        orders: List[OrderContext]
+        orders: List[OrderContext],
+        shipment_task: Optional["asyncio.Task[Dict[str, Any]]"] = None
     ) -> Dict[str, Any]:
         """Resolve order tracking inquiry."""
         order = orders[0] if orders else None
@@ -347,22 +813,28 @@ class CustomerServiceOutcome:
                 "action": "inform_no_orders",
             }
 
-        self._log_tool_call("orders.get_shipment_status", {"order_id": order.order_id})
-        self._log_action("provided_tracking_info", {"order_id": order.order_id})
+        if shipment_task is not None:
+            shipment = await shipment_task
+            # The speculative fetch is only recorded once its result is used
+            self._log_tool_call(state, "orders.get_shipment_status", {"order_id": order.order_id})
+        else:
+            shipment = await self._prefetch_shipment(order.order_id, state)
+        self._log_action(state, "provided_tracking_info", {"order_id": order.order_id})
 
         return {
             "summary": f"Provided tracking information for order {order.order_id}",
             "action": "provided_tracking",
             "data": {
                 "order_id": order.order_id,
-                "status": order.status,
-                "tracking_number": order.tracking_number,
-                "delivery_estimate": order.delivery_estimate,
+                "status": shipment["status"],
+                "tracking_number": shipment["tracking_number"],
+                "delivery_estimate": shipment["delivery_estimate"],
             }
         }
 
     async def _resolve_refund_request(
         self,
+        state: RequestState,
         details: Dict[str, Any],
         orders: List[OrderContext],
         customer: CustomerContext
@@ -377,7 +849,7 @@ class CustomerServiceOutcome:
 
         # Check if refund amount is within limits
         if order.total > self.max_refund:
-            self._log_action("refund_exceeds_limit", {
+            self._log_action(state, "refund_exceeds_limit", {
                 "amount": order.total,
                 "limit": self.max_refund
             })
@@ -392,12 +864,15 @@ class CustomerServiceOutcome:
             }
 
         # Process the refund
-        self._log_tool_call("orders.process_refund", {
+        self._log_tool_call(state, "orders.process_refund", {
             "order_id": order.order_id,
             "amount": order.total,
             "reason": details.get('reason', 'customer_request')
         })
-        self._log_action("refund_processed", {"amount": order.total})
+        self._log_action(state, "refund_processed", {"amount": order.total})
+
+        # The refund changes order state, so don't serve stale history
+        self._context_cache.pop(("orders.get_order_history", customer.customer_id), None)
 
         return {
             "summary": f"Processed full refund of ${order.total:.2f}",
@@ -410,11 +885,12 @@ class CustomerServiceOutcome:
 
     async def _resolve_general_inquiry(
         self,
+        state: RequestState,
         details: Dict[str, Any],
         customer: CustomerContext
     ) -> Dict[str, Any]:
         """Resolve general inquiry using knowledge base."""
-        self._log_tool_call("knowledge.search_articles", {"query": "general help"})
+        self._log_tool_call(state, "knowledge.search_articles", {"query": "general help"})
 
         return {
             "summary": "Provided helpful information from knowledge base",
@@ -428,55 +904,106 @@ class CustomerServiceOutcome:
         analysis: Dict[str, Any]
     ) -> str:
         """Generate a friendly response message."""
-        # In production, Claude would generate this based on context
+        if self.config.get('llm_response'):
+            # The Claude client is synchronous; keep it off the event loop
+            return await asyncio.to_thread(self._llm_generate, resolution, customer, analysis)
+        return self._render_template(resolution, customer)
 
-        action = resolution['action']
+    def _render_template(
+        self,
+        resolution: Dict[str, Any],
+        customer: CustomerContext
+    ) -> str:
+        """Render the response template for the resolution action."""
+        template = RESPONSE_TEMPLATES.get(resolution['action'], DEFAULT_RESPONSE_TEMPLATE)
+        return template.format_map({"name": customer.name, **resolution.get('data', {})})
 
-        if action == "provided_tracking":
-            data = resolution['data']
-            return (
-                f"Hi {customer.name}! Great news - your order {data['order_id']} is on its way! "
-                f"It's currently {data['status']} and should arrive by {data['delivery_estimate']}. "
-                f"You can track it with tracking number: {data['tracking_number']}. "
-                f"Is there anything else I can help you with?"
-            )
-        elif action == "refund_processed":
-            data = resolution['data']
-            return (
-                f"I've processed a refund of ${data['refund_amount']:.2f} for order {data['order_id']}. "
-                f"You should see this back on your original payment method within 5-7 business days. "
-                f"Is there anything else I can help you with today?"
-            )
-        elif action == "partial_refund_offered":
-            data = resolution['data']
-            return (
-                f"I can immediately process a ${data['offered_amount']:.2f} refund for you. "
-                f"For the remaining amount, I'll connect you with a specialist who can help further. "
-                f"Would you like me to proceed with the partial refund now?"
-            )
-        else:
-            return (
-                f"Thank you for reaching out, {customer.name}! "
-                f"I've found some helpful information for you. "
-                f"Is there anything specific you'd like to know more about?"
-            )
+    def _llm_generate(
+        self,
+        resolution: Dict[str, Any],
+        customer: CustomerContext,
+        analysis: Dict[str, Any]
+    ) -> str:
+        """Generate a response with Claude (blocking; run in a worker thread)."""
+        # In production, Claude would generate this based on context
+        # message = self.anthropic_client.messages.create(
+        #     model=self.config.get('model', 'claude-opus-4'),
+        #     max_tokens=512,
+        #     messages=[{"role": "user", "content": build_prompt(resolution, customer, analysis)}],
+        # )
+        # return message.content[0].text
+
+        # Simulated generation
+        return self._render_template(resolution, customer)
 
-    def _log_tool_call(self, tool: str, params: Dict[str, Any]):
+    def _log_tool_call(self, state: RequestState, tool: str, params: Dict[str, Any]):
         """Log a tool call."""
-        self.tools_called.append({
+        state.tools_called.append({
             "tool": tool,
             "params": params,
-            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "ts_ns": time.time_ns(),
         })
 
-    def _log_action(self, action: str, details: Dict[str, Any]):
-        """Log an action taken."""
-        self.actions_taken.append({
+    def _log_action(self, state: RequestState, action: str, details: Dict[str, Any]):
+        """Log an action taken, aborting if the resolution appears stalled."""
+        signature = hash((action, json.dumps(details, sort_keys=True, default=str)))
+        if signature in state.action_signatures:
+            raise StalledResolution(f"Action {action} repeated with the same details")
+        state.action_count += 1
+        if state.action_count > self._action_budget:
+            raise StalledResolution(f"Exceeded budget of {self._action_budget} actions")
+        state.action_signatures.add(signature)
+
+        state.actions_taken.append({
             "action": action,
             "details": details,
-            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "ts_ns": time.time_ns(),
         })
 
+    def _record(self, state: RequestState) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Add a request's logs to the instance history and flush them to the sink.
+
+        Returns:
+            The request's (actions_taken, tools_called), finalized for output
+        """
+        self.actions_taken.extend(state.actions_taken)
+        self.tools_called.extend(state.tools_called)
+        actions_taken = self._finalize_logs(state.actions_taken)
+        tools_called = self._finalize_logs(state.tools_called)
+        self._flush_logs(actions_taken + tools_called)
+        return actions_taken, tools_called
+
+    def _flush_logs(self, entries: List[Dict[str, Any]]):
+        """Write a request's log entries to the sink in one background batch."""
+        if self.log_sink is None or not entries:
+            return
+        task = asyncio.create_task(self.log_sink.write_batch(entries))
+        # Hold a reference until the write finishes so it isn't collected
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task: asyncio.Task):
+        """Forget a finished sink write, logging it if it failed."""
+        self._flush_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error writing logs to sink: {task.exception()}")
+
+    async def flush(self):
+        """Wait for pending log writes to the sink; call before shutdown."""
+        while self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+
+    def _finalize_logs(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Replace raw ts_ns values with ISO-8601 timestamps for output."""
+        finalized = []
+        for entry in entries:
+            entry = dict(entry)
+            ts_ns = entry.pop("ts_ns")
+            entry["timestamp"] = datetime.utcfromtimestamp(ts_ns / 1e9).isoformat() + "Z"
+            finalized.append(entry)
+        return finalized
+
 
 # Example usage
 async def main():
@@ -490,16 +1017,30 @@ async def main():
         }
     }
 
+    # Connect the shared MCP servers once at startup
+    await _MCP_HOST.connect_all({
+        "crm": {"command": "crm-mcp-server"},
+        "orders": {"command": "orders-mcp-server"},
+        "knowledge": {"command": "knowledge-mcp-server"},
+    })
+
     outcome = CustomerServiceOutcome(config)
 
-    result = await outcome.execute(
-        request_id="req_test123",
-        objective="Resolve customer inquiry",
-        customer_id="cust_abc123",
-        initial_message="Where is my order? I ordered it last week and haven't received it yet."
-    )
+    try:
+        result = await outcome.execute(
+            request_id="req_test123",
+            objective="Resolve customer inquiry",
+            customer_id="cust_abc123",
+            initial_message="Where is my order? I ordered it last week and haven't received it yet."
+        )
+        await outcome.flush()
+    finally:
+        await _MCP_HOST.close()
 
-    print(json.dumps(result, indent=2, default=str))
+    if orjson is not None:
+        print(orjson.dumps(result, default=str, option=orjson.OPT_INDENT_2).decode())
+    else:
+        print(json.dumps(result, indent=2, default=str))
 
 
 if __name__ == "__main__":
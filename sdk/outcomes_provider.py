@@ -14,22 +14,126 @@ It handles:
 """
 
 import asyncio
+import fnmatch
+import functools
+import itertools
 import json
 import logging
+import operator
 import os
+import re
+import secrets
 import time
-import uuid
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
 
 import yaml
 
+try:
+    import orjson
+except ImportError:  # optional; falls back to the stdlib json module
+    orjson = None
+
 # Configure logging
 logger = logging.getLogger("outcomes_engine")
 
+# libyaml's C loader when PyYAML was built with it; same safe semantics
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def _json_dumps(obj: Any) -> str:
+    """Serialize to JSON text, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
+# IDs are a random per-process prefix plus a counter, so minting one
+# doesn't read from the OS entropy pool
+_ID_PREFIX = secrets.token_hex(4)
+_id_counter = itertools.count()
+
+
+def _reseed_ids():
+    """Give this process a fresh ID prefix and counter."""
+    global _ID_PREFIX, _id_counter
+    _ID_PREFIX = secrets.token_hex(4)
+    _id_counter = itertools.count()
+
+
+# Forked workers (e.g. gunicorn --preload) would otherwise mint the same IDs
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reseed_ids)
+
+
+def _short_id(kind: str) -> str:
+    """Return a process-unique ID such as evt_1a2b3c4d00000001."""
+    return f"{kind}_{_ID_PREFIX}{next(_id_counter):08x}"
+
+
+# EngineConfig.peek_identity() reads at most this many lines
+_PEEK_MAX_LINES = 64
+
+# A ${VAR} reference in a config value; bare $VAR and $$ are left alone
+_ENV_VAR_RE = re.compile(r"\$\{([^}]+)\}")
+
+
+def _expand_env_vars(config: Any) -> Any:
+    """Expand ${VAR} references in a parsed config's strings, in place."""
+    root = [config]
+    stack: List[Any] = [root]
+    while stack:
+        container = stack.pop()
+        items = container.items() if isinstance(container, dict) else enumerate(container)
+        for key, value in items:
+            if isinstance(value, (dict, list)):
+                stack.append(value)
+            elif isinstance(value, str) and "${" in value:
+                container[key] = _ENV_VAR_RE.sub(
+                    lambda match: os.environ.get(match.group(1), match.group(0)), value
+                )
+    return root[0]
+
+
+# Comparison conditions such as "refund_amount > 50"
+_CONDITION_RE = re.compile(r"\s*(\w+)\s*(>=|<=|==|>|<)\s*(\S+)\s*")
+_CONDITION_OPERATORS = {
+    ">": operator.gt,
+    "<": operator.lt,
+    ">=": operator.ge,
+    "<=": operator.le,
+    "==": operator.eq,
+}
+
+
+def _compile_condition(condition: str) -> Callable[[Dict[str, Any]], bool]:
+    """Parse an escalation condition into a check over the execution context."""
+    match = _CONDITION_RE.fullmatch(condition)
+    if match:
+        field_name, op, value = match.groups()
+        try:
+            threshold = float(value)
+        except ValueError:
+            pass
+        else:
+            compare = _CONDITION_OPERATORS[op]
+            # A comparison against a field the context lacks never fires
+            return lambda context: field_name in context and compare(context[field_name], threshold)
+
+    # Anything else names a boolean flag set in the context
+    return lambda context: context.get(condition) is True
+
+
+def _compile_tool_patterns(patterns: List[str]) -> Optional[re.Pattern]:
+    """Compile wildcard tool patterns into one regex, or None if there are none."""
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns))
+
 
 class OutcomeStatus(Enum):
     """Possible outcome statuses."""
@@ -50,7 +154,7 @@ class EscalationTrigger(Enum):
     POLICY_VIOLATION = "policy_violation"
 
 
-@dataclass
+@dataclass(slots=True)
 class OutcomeRequest:
     """Represents an incoming outcome request."""
     request_id: str
@@ -66,7 +170,7 @@ class OutcomeRequest:
     metadata: Dict[str, Any] = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(slots=True)
 class OutcomeResponse:
     """Represents the response to an outcome request."""
     response_id: str
@@ -81,7 +185,21 @@ class OutcomeResponse:
     timestamps: Dict[str, str] = field(default_factory=dict)
 
 
-@dataclass
+class ToolSpec(NamedTuple):
+    """Resolved permission and limits for a single tool."""
+    allowed: bool
+    limits: Dict[str, Any]
+
+
+class OutcomeSpec(NamedTuple):
+    """An enabled outcome type's config with its execution defaults resolved."""
+    outcome: Dict[str, Any]
+    config: Dict[str, Any]
+    max_latency_default: float
+    default_effort: str
+
+
+@dataclass(slots=True)
 class EngineConfig:
     """Execution engine configuration loaded from outcomes.yml."""
     engine_id: str
@@ -103,11 +221,10 @@ class EngineConfig:
     @classmethod
     def from_yaml(cls, path: str) -> "EngineConfig":
         """Load configuration from YAML file."""
-        with open(path, 'r') as f:
-            config = yaml.safe_load(f)
+        config = cls._load_cached(path)
 
         # Expand environment variables
-        config = cls._expand_env_vars(config)
+        config = _expand_env_vars(config)
 
         # Support both old 'provider' and new 'execution_engine' keys
         engine_config = config.get('execution_engine', config.get('provider', {}))
@@ -130,19 +247,99 @@ class EngineConfig:
             logging_config=config.get('logging', {}),
         )
 
-    @staticmethod
-    def _expand_env_vars(config: Any) -> Any:
-        """Recursively expand environment variables in config."""
+    @classmethod
+    def peek_identity(cls, path: str) -> Tuple[str, str]:
+        """
+        Read an engine's (id, version) without parsing the whole config.
+
+        Only the leading lines up to the end of the execution_engine block
+        are parsed; the full file is loaded only if that header lacks them.
+        A legacy provider block is used only when the whole file was read,
+        since a later execution_engine block would take precedence.
+        """
+        header = []
+        seen_engine = False
+        whole_file = True
+        with open(path, 'r') as f:
+            for line in f:
+                if len(header) == _PEEK_MAX_LINES or (line.startswith(('---', '...')) and header):
+                    whole_file = False
+                    break
+                # A top-level key ends the engine block
+                if line[:1] not in ('', ' ', '\t', '\n', '#', '-'):
+                    if seen_engine:
+                        whole_file = False
+                        break
+                    seen_engine = line.startswith('execution_engine:')
+                header.append(line)
+
+        try:
+            config = yaml.load("".join(header), Loader=_YAML_LOADER)
+        except yaml.YAMLError:
+            config = None
+
         if isinstance(config, dict):
-            return {k: EngineConfig._expand_env_vars(v) for k, v in config.items()}
-        elif isinstance(config, list):
-            return [EngineConfig._expand_env_vars(item) for item in config]
-        elif isinstance(config, str) and config.startswith("${") and config.endswith("}"):
-            var_name = config[2:-1]
-            return os.environ.get(var_name, config)
+            if 'execution_engine' in config:
+                engine_config = config['execution_engine']
+            elif whole_file:
+                engine_config = config.get('provider')
+            else:
+                engine_config = None
+            if isinstance(engine_config, dict) and 'id' in engine_config and 'version' in engine_config:
+                engine_config = _expand_env_vars(engine_config)
+                return engine_config['id'], engine_config['version']
+
+        config = cls.from_yaml(path)
+        return config.engine_id, config.version
+
+    @staticmethod
+    def _load_cached(path: str) -> Any:
+        """
+        Parse a YAML config, reusing a JSON sidecar cache when it is current.
+
+        The sidecar (path + ".cache.json") holds the parsed tree before env
+        var expansion, so secrets from the environment are never written to
+        disk and environment changes still apply on every load. It records
+        the YAML's mtime and size and is only used when both match exactly;
+        a newer sidecar alone doesn't prove the YAML is unchanged, since
+        copies that preserve timestamps can install an older mtime.
+        """
+        cache_path = f"{path}.cache.json"
+        # Stat before reading, so an edit made mid-read invalidates the cache
+        stat = os.stat(path)
+        source = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        try:
+            with open(cache_path, 'r') as f:
+                cached = json.load(f)
+            if cached.get("source") == source:
+                return cached["config"]
+        except (OSError, ValueError, AttributeError, KeyError):
+            pass
+
+        with open(path, 'r') as f:
+            config = yaml.load(f, Loader=_YAML_LOADER)
+
+        if os.access(os.path.dirname(os.path.abspath(path)), os.W_OK):
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            try:
+                data = _json_dumps({"source": source, "config": config})
+                # Skip trees JSON can't represent exactly (e.g. non-str keys)
+                if json.loads(data)["config"] == config:
+                    with open(tmp_path, 'w') as f:
+                        f.write(data)
+                    os.replace(tmp_path, cache_path)
+            except (OSError, TypeError, ValueError) as e:
+                logger.debug(f"Not caching config {path}: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
         return config
 
 
+# Queued by ConversionsClient.flush() to stop the background sender
+_STOP_SENDER = object()
+
+
 class ConversionsClient:
     """Client for reporting to the Conversions API."""
 
@@ -152,23 +349,120 @@ class ConversionsClient:
         self.auto_report = config.get('auto_report', True)
         self.retry_config = config.get('retry', {})
 
+        # Events are sent by a background task so execute() never waits on
+        # the Conversions API; with batching enabled they are coalesced
+        batching = config.get('batching', {})
+        if batching.get('enabled', False):
+            self.max_batch = batching.get('max_batch_size', 32)
+            self.max_wait = batching.get('flush_interval_seconds', 0.05)
+        else:
+            self.max_batch, self.max_wait = 1, 0
+        self.queue_size = batching.get('queue_size', 1000)
+        self._queue: Optional[asyncio.Queue] = None
+        self._sender: Optional[asyncio.Task] = None
+        self._sender_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _sender_running(self) -> bool:
+        """Whether the background sender is alive on the current event loop."""
+        return (
+            self._sender is not None
+            and not self._sender.done()
+            and self._sender_loop is asyncio.get_running_loop()
+        )
+
     async def report_event(self, event: Dict[str, Any]) -> bool:
-        """Report an event to the Conversions API."""
+        """Queue an event for delivery to the Conversions API."""
         if not self.endpoint or not self.api_key:
             logger.warning("Conversions API not configured, skipping report")
             return False
 
+        # A sender from an earlier asyncio.run() is dead with its loop
+        if not self._sender_running():
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._sender = asyncio.create_task(self._run_sender(self._queue))
+            self._sender_loop = asyncio.get_running_loop()
+
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning(
+                f"Conversions queue full, dropping {event['event_type']} for {event['request_id']}"
+            )
+            return False
+        return True
+
+    async def flush(self):
+        """Deliver all queued events and stop the background sender."""
+        running = self._sender_running()
+        sender, queue = self._sender, self._queue
+        # Detach before draining so events reported meanwhile start a new sender
+        self._sender = self._queue = None
+        if not running:
+            return
+        await queue.put(_STOP_SENDER)
+        await sender
+
+    async def _run_sender(self, queue: asyncio.Queue):
+        """Drain queue, sending up to max_batch events per request."""
+        loop = asyncio.get_running_loop()
+        while True:
+            event = await queue.get()
+            if event is _STOP_SENDER:
+                return
+
+            batch = [event]
+            stopping = False
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                if not queue.empty():
+                    event = queue.get_nowait()
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        event = await asyncio.wait_for(queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if event is _STOP_SENDER:
+                    stopping = True
+                    break
+                batch.append(event)
+
+            try:
+                await self._send_batch(batch)
+            except Exception as e:
+                logger.error(f"Error reporting conversion events: {e}")
+
+            if stopping:
+                return
+
+    async def _send_batch(self, events: List[Dict[str, Any]]) -> bool:
+        """Send a batch of events to the Conversions API."""
         # In production, this would make an HTTP request
-        # For now, we log the event
-        logger.info(f"Reporting conversion event: {event['event_type']} for {event['request_id']}")
+        # For now, we log the events
+        for event in events:
+            logger.info(f"Reporting conversion event: {event['event_type']} for {event['request_id']}")
+
+        # A single event goes to the events endpoint as-is; several use
+        # the batch endpoint's {"events": [...]} body
+        if len(events) == 1:
+            url, payload = self.endpoint, events[0]
+        else:
+            url, payload = f"{self.endpoint.rstrip('/')}/batch", {"events": events}
+        body = _json_dumps(payload)
+        logger.debug(f"Posting {len(events)} conversion event(s), {len(body)} bytes, to {url}")
 
         # Simulate API call
         # In real implementation:
         # async with aiohttp.ClientSession() as session:
         #     async with session.post(
-        #         self.endpoint,
-        #         json=event,
-        #         headers={"Authorization": f"Bearer {self.api_key}"}
+        #         url,
+        #         data=body,
+        #         headers={
+        #             "Authorization": f"Bearer {self.api_key}",
+        #             "Content-Type": "application/json",
+        #         }
         #     ) as response:
         #         return response.status == 200
 
@@ -177,7 +471,7 @@ class ConversionsClient:
     def create_success_event(self, request: OutcomeRequest, response: OutcomeResponse) -> Dict[str, Any]:
         """Create a success event for the Conversions API."""
         return {
-            "event_id": f"evt_{uuid.uuid4().hex[:12]}",
+            "event_id": _short_id("evt"),
             "event_type": "outcome.success",
             "event_time": datetime.utcnow().isoformat() + "Z",
             "request_id": request.request_id,
@@ -192,7 +486,7 @@ class ConversionsClient:
     def create_failure_event(self, request: OutcomeRequest, response: OutcomeResponse, reason: str) -> Dict[str, Any]:
         """Create a failure event for the Conversions API."""
         return {
-            "event_id": f"evt_{uuid.uuid4().hex[:12]}",
+            "event_id": _short_id("evt"),
             "event_type": "outcome.failure",
             "event_time": datetime.utcnow().isoformat() + "Z",
             "request_id": request.request_id,
@@ -214,6 +508,42 @@ class EscalationHandler:
         self.destinations = config.get('destinations', [])
         self.handoff_content = config.get('handoff_content', {})
 
+        # Destinations only change with config, so pick the primary once
+        self._sorted_destinations = sorted(
+            self.destinations,
+            key=lambda d: d.get('priority', 999)
+        )
+        self._primary_destination = (
+            self._sorted_destinations[0] if self._sorted_destinations else None
+        )
+
+        # Conditions repeated across triggers are compiled once
+        compiled_conditions: Dict[str, Callable[[Dict[str, Any]], bool]] = {}
+
+        # Trigger parameters unpacked once, kept in config order so the
+        # first matching trigger still wins
+        self._compiled_triggers: List[Tuple[str, Any]] = []
+        for trigger in self.triggers:
+            trigger_type = trigger.get('type')
+            if trigger_type == 'confidence_threshold':
+                compiled = trigger.get('threshold', 0.7)
+            elif trigger_type == 'explicit_request':
+                patterns = trigger.get('patterns', [])
+                if not patterns:
+                    continue
+                # One scan of the message for all phrases
+                compiled = re.compile("|".join(map(re.escape, patterns)), re.IGNORECASE)
+            elif trigger_type == 'max_attempts':
+                compiled = trigger.get('attempts', 3)
+            elif trigger_type == 'out_of_scope':
+                compiled = [
+                    compiled_conditions.setdefault(condition, _compile_condition(condition))
+                    for condition in trigger.get('conditions', [])
+                ]
+            else:
+                continue
+            self._compiled_triggers.append((trigger_type, compiled))
+
     def should_escalate(
         self,
         confidence: float,
@@ -222,42 +552,25 @@ class EscalationHandler:
         context: Dict[str, Any]
     ) -> Optional[EscalationTrigger]:
         """Check if escalation should be triggered."""
-        for trigger in self.triggers:
-            trigger_type = trigger.get('type')
-
+        for trigger_type, compiled in self._compiled_triggers:
             if trigger_type == 'confidence_threshold':
-                if confidence < trigger.get('threshold', 0.7):
+                if confidence < compiled:
                     return EscalationTrigger.CONFIDENCE_THRESHOLD
 
             elif trigger_type == 'explicit_request':
-                patterns = trigger.get('patterns', [])
-                message_lower = user_message.lower()
-                if any(pattern.lower() in message_lower for pattern in patterns):
+                if compiled.search(user_message):
                     return EscalationTrigger.EXPLICIT_REQUEST
 
             elif trigger_type == 'max_attempts':
-                if attempt_count >= trigger.get('attempts', 3):
+                if attempt_count >= compiled:
                     return EscalationTrigger.MAX_ATTEMPTS
 
             elif trigger_type == 'out_of_scope':
-                conditions = trigger.get('conditions', [])
-                for condition in conditions:
-                    if self._evaluate_condition(condition, context):
-                        return EscalationTrigger.OUT_OF_SCOPE
+                if any(check(context) for check in compiled):
+                    return EscalationTrigger.OUT_OF_SCOPE
 
         return None
 
-    def _evaluate_condition(self, condition: str, context: Dict[str, Any]) -> bool:
-        """Evaluate an escalation condition."""
-        # Simple condition evaluation
-        # In production, this would be more sophisticated
-        if "refund_amount > " in condition:
-            threshold = float(condition.split("> ")[1])
-            return context.get('refund_amount', 0) > threshold
-        elif condition in context:
-            return context[condition] is True
-        return False
-
     async def escalate(
         self,
         request: OutcomeRequest,
@@ -266,7 +579,7 @@ class EscalationHandler:
         transcript: List[Dict[str, Any]]
     ) -> Dict[str, Any]:
         """Perform escalation to human operator."""
-        handoff_id = f"hoff_{uuid.uuid4().hex[:12]}"
+        handoff_id = _short_id("hoff")
 
         # Build handoff payload
         payload = {
@@ -320,11 +633,7 @@ class EscalationHandler:
 
     def _get_destination(self) -> Optional[Dict[str, Any]]:
         """Get the highest priority available destination."""
-        sorted_destinations = sorted(
-            self.destinations,
-            key=lambda d: d.get('priority', 999)
-        )
-        return sorted_destinations[0] if sorted_destinations else None
+        return self._primary_destination
 
     async def _send_to_destination(self, destination: Dict[str, Any], payload: Dict[str, Any]):
         """Send handoff to the configured destination."""
@@ -345,13 +654,58 @@ class OutcomesEngine:
 
     def __init__(self, config: EngineConfig):
         self.config = config
-        self.conversions = ConversionsClient(config.conversions)
-        self.escalation = EscalationHandler(config.escalation)
+
+        # Tool permission lists matched as one regex each
+        self._denied_re = _compile_tool_patterns(config.tools.get('denied', []))
+        self._allowed_re = _compile_tool_patterns(config.tools.get('allowed', []))
+
+        # Lookup indexes; the first enabled entry for a type wins
+        self._outcome_specs: Dict[str, OutcomeSpec] = {}
+        for outcome in config.outcomes:
+            if outcome.get('enabled', True) and outcome.get('type') not in self._outcome_specs:
+                outcome_config = outcome.get('config', {})
+                self._outcome_specs[outcome.get('type')] = OutcomeSpec(
+                    outcome=outcome,
+                    config=outcome_config,
+                    max_latency_default=outcome_config.get('max_latency_seconds', 300),
+                    default_effort=outcome_config.get('default_effort', 'standard'),
+                )
+        self._tool_limits = config.tools.get('limits', {})
+
+        # Per-tool permission and limits for every tool the context sources
+        # declare; other names fall back to the pattern match
+        tool_names = set(self._tool_limits)
+        for source_name, source in config.context_sources.items():
+            tool_names.update(f"{source_name}.{tool}" for tool in source.get('tools', []))
+        self._tool_specs: Dict[str, ToolSpec] = {
+            name: self._resolve_tool_spec(name) for name in tool_names
+        }
+
+        # Engine identity reported on every response; fixed for the engine's lifetime
+        self._engine_metadata = MappingProxyType({
+            "engine_id": config.engine_id,
+            "model": config.model,
+            "model_version": config.model_version,
+            "harness": config.harness,
+            "harness_version": config.harness_version,
+            "vendor": config.vendor,
+            "capabilities": tuple(config.capabilities),
+        })
 
         # Configure logging
         log_level = getattr(logging, config.logging_config.get('level', 'INFO'))
         logger.setLevel(log_level)
 
+    @functools.cached_property
+    def conversions(self) -> ConversionsClient:
+        """Conversions API client, created on first use."""
+        return ConversionsClient(self.config.conversions)
+
+    @functools.cached_property
+    def escalation(self) -> EscalationHandler:
+        """Escalation handler, created on first use."""
+        return EscalationHandler(self.config.escalation)
+
     @classmethod
     def from_config(cls, path: str) -> "OutcomesEngine":
         """Create execution engine from configuration file."""
@@ -361,44 +715,32 @@ class OutcomesEngine:
 
     def get_outcome_config(self, outcome_type: str) -> Optional[Dict[str, Any]]:
         """Get configuration for a specific outcome type."""
-        for outcome in self.config.outcomes:
-            if outcome.get('type') == outcome_type and outcome.get('enabled', True):
-                return outcome
-        return None
+        spec = self._outcome_specs.get(outcome_type)
+        return spec.outcome if spec else None
 
     def is_tool_allowed(self, tool_name: str) -> bool:
         """Check if a tool is allowed by the configuration."""
-        allowed = self.config.tools.get('allowed', [])
-        denied = self.config.tools.get('denied', [])
-
         # Check denied first
-        for pattern in denied:
-            if self._matches_pattern(tool_name, pattern):
-                return False
+        if self._denied_re and self._denied_re.fullmatch(tool_name):
+            return False
 
         # Then check allowed
-        for pattern in allowed:
-            if self._matches_pattern(tool_name, pattern):
-                return True
+        return bool(self._allowed_re and self._allowed_re.fullmatch(tool_name))
 
-        return False
+    def get_tool_spec(self, tool_name: str) -> ToolSpec:
+        """Get the permission and limits for a tool in one lookup."""
+        spec = self._tool_specs.get(tool_name)
+        if spec is None:
+            spec = self._resolve_tool_spec(tool_name)
+        return spec
 
-    def _matches_pattern(self, name: str, pattern: str) -> bool:
-        """Check if a name matches a wildcard pattern."""
-        if '*' not in pattern:
-            return name == pattern
-
-        parts = pattern.split('*')
-        if len(parts) == 2:
-            prefix, suffix = parts
-            return name.startswith(prefix) and name.endswith(suffix)
-
-        return False
+    def _resolve_tool_spec(self, tool_name: str) -> ToolSpec:
+        """Resolve a tool's spec from the permission patterns and limits."""
+        return ToolSpec(self.is_tool_allowed(tool_name), self.get_tool_limits(tool_name))
 
     def get_tool_limits(self, tool_name: str) -> Dict[str, Any]:
         """Get limits for a specific tool."""
-        limits = self.config.tools.get('limits', {})
-        return limits.get(tool_name, {})
+        return self._tool_limits.get(tool_name, {})
 
     async def execute(
         self,
@@ -406,12 +748,13 @@ class OutcomesEngine:
         trace: bool = False
     ) -> OutcomeResponse:
         """Execute an outcome request."""
-        start_time = time.time()
-        response_id = f"resp_{uuid.uuid4().hex[:12]}"
+        start_ns = time.monotonic_ns()
+        started_at = datetime.utcnow().isoformat() + "Z"
+        response_id = _short_id("resp")
 
         # Get outcome configuration
-        outcome_config = self.get_outcome_config(request.outcome_type)
-        if not outcome_config:
+        outcome_spec = self._outcome_specs.get(request.outcome_type)
+        if not outcome_spec:
             return self._create_error_response(
                 response_id, request,
                 f"Outcome type {request.outcome_type} not supported or disabled"
@@ -419,9 +762,9 @@ class OutcomesEngine:
 
         # Check delivery constraints
         max_latency = request.delivery_constraints.get(
-            'max_latency_seconds',
-            outcome_config.get('config', {}).get('max_latency_seconds', 300)
+            'max_latency_seconds', outcome_spec.max_latency_default
         )
+        outcome_config = outcome_spec.outcome
 
         # Initialize execution context
         context = {
@@ -440,13 +783,14 @@ class OutcomesEngine:
             # Check if escalation was triggered
             if result.get('escalated'):
                 return self._create_escalated_response(
-                    response_id, request, result, start_time
+                    response_id, request, result, start_ns
                 )
 
             # Evaluate success criteria
             criteria_results = self._evaluate_criteria(request, result)
 
             # Create response
+            completed_at = datetime.utcnow().isoformat() + "Z"
             response = OutcomeResponse(
                 response_id=response_id,
                 request_id=request.request_id,
@@ -458,29 +802,22 @@ class OutcomesEngine:
                 },
                 success_criteria_results=criteria_results,
                 delivery_metrics={
-                    "latency_seconds": time.time() - start_time,
+                    "latency_seconds": (time.monotonic_ns() - start_ns) / 1e9,
                     "tokens_used": result.get('tokens_used', 0),
                     "cost_breakdown": {
                         "compute": result.get('compute_cost', 0),
                         "risk_premium": 0,  # Calculated by marketplace
                         "total": result.get('compute_cost', 0),
                     },
-                    "effort_level": outcome_config.get('config', {}).get('default_effort', 'standard'),
+                    "effort_level": outcome_spec.default_effort,
                     "tool_calls": context.get('tools_called', []),
                 },
-                execution_engine={
-                    "engine_id": self.config.engine_id,
-                    "model": self.config.model,
-                    "model_version": self.config.model_version,
-                    "harness": self.config.harness,
-                    "harness_version": self.config.harness_version,
-                    "vendor": self.config.vendor,
-                    "capabilities": self.config.capabilities,
-                },
+                # Shallow copy so callers can't mutate the shared metadata
+                execution_engine=dict(self._engine_metadata),
                 timestamps={
-                    "requested_at": request.metadata.get('requested_at', datetime.utcnow().isoformat() + "Z"),
-                    "started_at": datetime.utcnow().isoformat() + "Z",
-                    "completed_at": datetime.utcnow().isoformat() + "Z",
+                    "requested_at": request.metadata.get('requested_at', started_at),
+                    "started_at": started_at,
+                    "completed_at": completed_at,
                 }
             )
 
@@ -556,27 +893,26 @@ class OutcomesEngine:
     ) -> Dict[str, Any]:
         """Evaluate success criteria against the result."""
         criteria = request.success_criteria
-        results = {"required": [], "optional": [], "overall_success": True}
+        if not criteria:
+            return {"required": [], "optional": [], "overall_success": True}
 
         # Evaluate required criteria
-        for criterion in criteria.get('required', []):
-            passed = self._evaluate_single_criterion(criterion, result)
-            results["required"].append({
-                "metric": criterion['metric'],
-                "passed": passed,
-            })
-            if not passed:
-                results["overall_success"] = False
+        required = [
+            {"metric": criterion['metric'], "passed": self._evaluate_single_criterion(criterion, result)}
+            for criterion in criteria.get('required', [])
+        ]
 
         # Evaluate optional criteria
-        for criterion in criteria.get('optional', []):
-            passed = self._evaluate_single_criterion(criterion, result)
-            results["optional"].append({
-                "metric": criterion['metric'],
-                "passed": passed,
-            })
+        optional = [
+            {"metric": criterion['metric'], "passed": self._evaluate_single_criterion(criterion, result)}
+            for criterion in criteria.get('optional', [])
+        ]
 
-        return results
+        return {
+            "required": required,
+            "optional": optional,
+            "overall_success": all(entry["passed"] for entry in required),
+        }
 
     def _evaluate_single_criterion(
         self,
@@ -600,6 +936,7 @@ class OutcomesEngine:
         error: str
     ) -> OutcomeResponse:
         """Create an error response."""
+        now = datetime.utcnow().isoformat() + "Z"
         return OutcomeResponse(
             response_id=response_id,
             request_id=request.request_id,
@@ -608,8 +945,8 @@ class OutcomesEngine:
             success_criteria_results={"required": [], "optional": [], "overall_success": False},
             delivery_metrics={"error": error},
             timestamps={
-                "requested_at": datetime.utcnow().isoformat() + "Z",
-                "completed_at": datetime.utcnow().isoformat() + "Z",
+                "requested_at": now,
+                "completed_at": now,
             }
         )
 
@@ -618,9 +955,10 @@ class OutcomesEngine:
         response_id: str,
         request: OutcomeRequest,
         result: Dict[str, Any],
-        start_time: float
+        start_ns: int
     ) -> OutcomeResponse:
         """Create an escalated response."""
+        now = datetime.utcnow().isoformat() + "Z"
         return OutcomeResponse(
             response_id=response_id,
             request_id=request.request_id,
@@ -628,7 +966,7 @@ class OutcomesEngine:
             outcome=None,
             escalation=result.get('escalation'),
             delivery_metrics={
-                "latency_seconds": time.time() - start_time,
+                "latency_seconds": (time.monotonic_ns() - start_ns) / 1e9,
                 "tokens_used": result.get('tokens_used', 0),
                 "cost_breakdown": {
                     "compute": result.get('compute_cost', 0),
@@ -636,8 +974,8 @@ class OutcomesEngine:
                 },
             },
             timestamps={
-                "requested_at": datetime.utcnow().isoformat() + "Z",
-                "escalated_at": datetime.utcnow().isoformat() + "Z",
+                "requested_at": now,
+                "escalated_at": now,
             }
         )
 
@@ -652,17 +990,34 @@ class OutcomeHooks:
 
     def __init__(self, engine: OutcomesEngine):
         self.engine = engine
-        self.current_context = {}
+        self.current_context = {'tools_called': []}
 
     async def pre_tool_call(self, tool_name: str, args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Called before each tool call."""
+        return self.check_tool_call(tool_name, args)
+
+    async def post_tool_call(
+        self,
+        tool_name: str,
+        args: Dict[str, Any],
+        result: Any
+    ):
+        """Called after each tool call."""
+        self.record_tool_call(tool_name, args, result)
+
+    # Synchronous bodies of the tool-call hooks, for callers that run
+    # checks inline rather than through the SDK's awaited hooks
+    def check_tool_call(self, tool_name: str, args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return an error dict if the tool call is not permitted, else None."""
+        spec = self.engine.get_tool_spec(tool_name)
+
         # Check if tool is allowed
-        if not self.engine.is_tool_allowed(tool_name):
+        if not spec.allowed:
             logger.warning(f"Tool {tool_name} not allowed")
             return {"error": f"Tool {tool_name} not permitted"}
 
         # Check tool limits
-        limits = self.engine.get_tool_limits(tool_name)
+        limits = spec.limits
         if limits:
             # Validate against limits
             if 'max_amount' in limits and 'amount' in args:
@@ -671,15 +1026,10 @@ class OutcomeHooks:
 
         return None  # Allow the call
 
-    async def post_tool_call(
-        self,
-        tool_name: str,
-        args: Dict[str, Any],
-        result: Any
-    ):
-        """Called after each tool call."""
+    def record_tool_call(self, tool_name: str, args: Dict[str, Any], result: Any):
+        """Record a finished tool call in the current context."""
         # Track tool usage
-        self.current_context.setdefault('tools_called', []).append({
+        self.current_context['tools_called'].append({
             "tool": tool_name,
             "timestamp": datetime.utcnow().isoformat() + "Z",
             "success": not isinstance(result, Exception),
@@ -733,4 +1083,15 @@ if __name__ == "__main__":
         print(f"Status: {response.status.value}")
         print(f"Response ID: {response.response_id}")
 
-    asyncio.run(main())
+        # Deliver any queued Conversions events before exiting
+        await engine.conversions.flush()
+
+    try:
+        import uvloop
+    except ImportError:  # optional; the default asyncio loop works too
+        uvloop = None
+
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())